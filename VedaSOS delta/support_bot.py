@@ -1,7 +1,14 @@
 import asyncio
-import json
 import os
+import sys
+import time
+from dataclasses import dataclass
 from datetime import datetime
+from functools import partial
+import aiohttp
+import aiosqlite
+import orjson
+from cachetools import TTLCache
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application,
@@ -12,7 +19,6 @@ from telegram.ext import (
     filters,
     ContextTypes
 )
-import requests
 import logging
 
 # Настройка логирования
@@ -29,19 +35,90 @@ BRANCH, DESCRIPTION = range(2)
 TELEGRAM_TOKEN = "ВАШ_ТОКЕН_БОТА"
 PYRUS_API_TOKEN = "ВАШ_ТОКЕН_PYRUS"
 PYRUS_FORM_ID = "ID_ФОРМЫ_PYRUS"
+PYRUS_API_URL = "https://api.pyrus.com/v4/tasks"
+PYRUS_TIMEOUT = 10
+# Пул соединений с Pyrus (сессия работает с одним хостом api.pyrus.com)
+PYRUS_MAX_CONNECTIONS = 100
+PYRUS_KEEPALIVE_TIMEOUT = 60
+
+# Заголовки запросов к Pyrus (задаются сессии по умолчанию)
+_PYRUS_HEADERS = {
+    "Authorization": f"Bearer {PYRUS_API_TOKEN}",
+    "Content-Type": "application/json"
+}
+
+# Webhook: публичный домен (за HTTPS-прокси, например nginx) и локальный адрес
+WEBHOOK_HOST = "ВАШ_ДОМЕН"
+WEBHOOK_LISTEN = "0.0.0.0"
+WEBHOOK_PORT = 8443
 
 # Пути к файлам
 DATA_DIR = "data"
+DB_FILE = os.path.join(DATA_DIR, "bot.db")
+# JSON файлы прежних версий: переносятся в базу при первом запуске
 GROUPS_FILE = os.path.join(DATA_DIR, "groups.json")
 USER_SETTINGS_FILE = os.path.join(DATA_DIR, "user_settings.json")
 LOCALES_DIR = "locales"
 
+# Схема базы данных
+DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS groups (
+    id INTEGER PRIMARY KEY,
+    title TEXT,
+    added_at TEXT,
+    last_activity TEXT
+);
+CREATE TABLE IF NOT EXISTS user_settings (
+    user_id INTEGER PRIMARY KEY,
+    language TEXT
+);
+"""
+
+# Интервал фонового сохранения данных в базу (секунды)
+SAVE_INTERVAL = 5
+# Минимальный интервал обновления last_activity группы (секунды)
+ACTIVITY_UPDATE_INTERVAL = 60
+
+# Незавершённые заявки: максимум одновременно, время жизни и период очистки (секунды)
+SESSION_MAX_SIZE = 10000
+SESSION_TTL = 1800
+SESSION_CLEANUP_INTERVAL = 300
+
+
+class CallbackDataHandler(CallbackQueryHandler):
+    """Обработчик callback кнопок со сравнением строк вместо регулярных выражений"""
+    
+    def __init__(self, callback, exact=(), prefixes=()):
+        super().__init__(callback)
+        self.exact = frozenset(exact)
+        self.prefixes = tuple(prefixes)
+    
+    def check_update(self, update):
+        """Проверка, подходит ли callback_data этому обработчику"""
+        if not isinstance(update, Update) or not update.callback_query:
+            return False
+        data = update.callback_query.data
+        if not isinstance(data, str):
+            return False
+        return data in self.exact or data.startswith(self.prefixes)
+
+
+@dataclass(slots=True)
+class TicketDraft:
+    """Данные заявки, собираемые в процессе диалога"""
+    group_name: str
+    group_id: int
+    user_name: str
+    branch: str = ''
+    description: str = ''
+
 
 class LocalizationManager:
     """Менеджер локализации"""
     
     def __init__(self):
         self.locales = {}
+        self.composite = {}
         self.load_locales()
     
     def load_locales(self):
@@ -49,27 +126,73 @@ class LocalizationManager:
         for lang in ['RU', 'UZ']:
             locale_file = os.path.join(LOCALES_DIR, f"{lang}.json")
             try:
-                with open(locale_file, 'r', encoding='utf-8') as f:
-                    self.locales[lang] = json.load(f)
+                with open(locale_file, 'rb') as f:
+                    self.locales[lang] = dict(self.flatten(orjson.loads(f.read())))
                 logger.info(f"Загружена локализация: {lang}")
             except FileNotFoundError:
                 logger.error(f"Файл локализации не найден: {locale_file}")
                 self.locales[lang] = {}
+        
+        for lang in self.locales:
+            self.composite[lang] = self.build_composite(lang)
+    
+    @staticmethod
+    def flatten(data, prefix=''):
+        """Разворачивание вложенных ключей в плоские вида 'welcome.title'"""
+        for key, value in data.items():
+            if isinstance(value, dict):
+                yield from LocalizationManager.flatten(value, f"{prefix}{key}.")
+            else:
+                # Интернирование: одинаковые тексты и ключи хранятся в одном объекте
+                if isinstance(value, str):
+                    value = sys.intern(value)
+                yield sys.intern(f"{prefix}{key}"), value
+    
+    def build_composite(self, lang):
+        """Сборка составных сообщений из нескольких ключей"""
+        welcome = [
+            self.get(lang, f'welcome.{key}')
+            for key in ('title', 'description', 'features', 'commands', 'warning')
+        ]
+        return {
+            # /start в группе: приветствие и подтверждение одним сообщением
+            'welcome_group_saved': "\n\n".join(
+                welcome + [self.get(lang, 'ticket.group_saved')]
+            ),
+            # Заголовок экранируется: форматируются только параметры из confirm_details
+            'confirm_full': (
+                f"{self.get(lang, 'ticket.confirm_title').replace('{', '{{').replace('}', '}}')}\n\n"
+                f"{self.get(lang, 'ticket.confirm_details')}"
+            ),
+        }
     
-    def get(self, lang, *keys, **kwargs):
-        """Получение локализованного текста"""
-        try:
-            text = self.locales.get(lang, self.locales['RU'])
-            for key in keys:
-                text = text[key]
-            
-            # Форматирование с параметрами
-            if kwargs:
-                return text.format(**kwargs)
+    def get_composite(self, lang, name, **kwargs):
+        """Получение составного сообщения (с откатом на русский язык)"""
+        text = self.composite.get(lang, self.composite['RU'])[name]
+        return self.format_text(text, name, kwargs)
+    
+    @staticmethod
+    def format_text(text, key, kwargs):
+        """Форматирование текста с параметрами"""
+        if not kwargs:
             return text
-        except (KeyError, TypeError):
-            logger.error(f"Ключ локализации не найден: {'.'.join(keys)}")
-            return f"[Missing translation: {'.'.join(keys)}]"
+        try:
+            return text.format(**kwargs)
+        except (KeyError, IndexError, ValueError, TypeError) as e:
+            logger.error(f"Ошибка форматирования текста {key}: {e}")
+            return f"[Missing translation: {key}]"
+    
+    def get(self, lang, *keys, **kwargs):
+        """Получение локализованного текста по ключу 'раздел.ключ'"""
+        key = '.'.join(keys)
+        text = self.locales.get(lang, {}).get(key)
+        if text is None:
+            text = self.locales['RU'].get(key)
+        if text is None:
+            logger.error(f"Ключ локализации не найден: {key}")
+            return f"[Missing translation: {key}]"
+        
+        return self.format_text(text, key, kwargs)
 
 
 class DataManager:
@@ -77,8 +200,16 @@ class DataManager:
     
     def __init__(self):
         self.ensure_data_dir()
-        self.groups = self.load_groups()
-        self.user_settings = self.load_user_settings()
+        self.db = None
+        # Данные загружаются из базы в open(), чтение идёт из памяти
+        self.groups = {}
+        self.user_settings = {}
+        self._now_cached = (0, "")
+        # Время последней активности групп в секундах, чтобы не разбирать ISO строки
+        self._activity_ts = {}
+        self._dirty_groups = set()
+        self._dirty_users = set()
+        self._autosave_task = None
     
     def ensure_data_dir(self):
         """Создание директории для данных если её нет"""
@@ -86,122 +217,351 @@ class DataManager:
             os.makedirs(DATA_DIR)
             logger.info(f"Создана директория для данных: {DATA_DIR}")
     
-    def load_groups(self):
+    async def open(self):
+        """Подключение к базе данных и загрузка данных"""
+        self.db = await aiosqlite.connect(DB_FILE)
+        await self.db.execute("PRAGMA journal_mode=WAL")
+        await self.db.execute("PRAGMA synchronous=NORMAL")
+        await self.db.executescript(DB_SCHEMA)
+        await self.db.commit()
+        
+        await self.load_groups()
+        await self.load_user_settings()
+        if not self.groups and not self.user_settings:
+            await self.import_legacy_json()
+    
+    async def close(self):
+        """Запись несохранённых данных и закрытие базы данных"""
+        await self.stop_autosave()
+        if self.db is not None:
+            await self.db.close()
+            self.db = None
+    
+    async def load_groups(self):
         """Загрузка данных о группах"""
-        if os.path.exists(GROUPS_FILE):
-            try:
-                with open(GROUPS_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                logger.error(f"Ошибка чтения {GROUPS_FILE}")
-                return {}
-        return {}
-    
-    def save_groups(self):
-        """Сохранение данных о группах"""
-        with open(GROUPS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.groups, f, ensure_ascii=False, indent=2)
-        logger.info("Данные групп сохранены")
-    
-    def load_user_settings(self):
+        async with self.db.execute(
+            "SELECT id, title, added_at, last_activity FROM groups"
+        ) as cursor:
+            async for chat_id, title, added_at, last_activity in cursor:
+                self.groups[chat_id] = {
+                    "id": chat_id,
+                    "title": title,
+                    "added_at": added_at,
+                    "last_activity": last_activity
+                }
+                self.remember_activity(chat_id, last_activity)
+    
+    async def save_groups(self):
+        """Сохранение изменённых групп"""
+        chat_ids, self._dirty_groups = self._dirty_groups, set()
+        try:
+            rows = [
+                (group["id"], group["title"], group["added_at"], group["last_activity"])
+                for group in map(self.groups.__getitem__, chat_ids)
+            ]
+            await self.db.executemany(
+                "INSERT INTO groups (id, title, added_at, last_activity) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET "
+                "title = excluded.title, last_activity = excluded.last_activity",
+                rows
+            )
+            await self.db.commit()
+        except BaseException:
+            # Изменения попадут в следующее сохранение
+            self._dirty_groups |= chat_ids
+            raise
+        logger.info(f"Данные групп сохранены: {len(rows)}")
+    
+    async def load_user_settings(self):
         """Загрузка настроек пользователей"""
-        if os.path.exists(USER_SETTINGS_FILE):
+        async with self.db.execute(
+            "SELECT user_id, language FROM user_settings"
+        ) as cursor:
+            async for user_id, language in cursor:
+                self.user_settings[user_id] = language
+    
+    async def save_user_settings(self):
+        """Сохранение изменённых настроек пользователей"""
+        user_ids, self._dirty_users = self._dirty_users, set()
+        try:
+            rows = [(user_id, self.user_settings[user_id]) for user_id in user_ids]
+            await self.db.executemany(
+                "INSERT INTO user_settings (user_id, language) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET language = excluded.language",
+                rows
+            )
+            await self.db.commit()
+        except BaseException:
+            self._dirty_users |= user_ids
+            raise
+        logger.info(f"Настройки пользователей сохранены: {len(rows)}")
+    
+    def load_legacy_json(self, path):
+        """Чтение JSON файла данных прежних версий бота"""
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'rb') as f:
+                data = orjson.loads(f.read())
+        except orjson.JSONDecodeError:
+            logger.error(f"Ошибка чтения {path}")
+            return {}
+        if not isinstance(data, dict):
+            logger.error(f"Неверный формат {path}")
+            return {}
+        return data
+    
+    async def import_legacy_json(self):
+        """Перенос данных из JSON файлов в пустую базу данных"""
+        for key, group in self.load_legacy_json(GROUPS_FILE).items():
+            # Приводим запись к полям таблицы, ID берём из ключа
             try:
-                with open(USER_SETTINGS_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                logger.error(f"Ошибка чтения {USER_SETTINGS_FILE}")
-                return {}
-        return {}
-    
-    def save_user_settings(self):
-        """Сохранение настроек пользователей"""
-        with open(USER_SETTINGS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.user_settings, f, ensure_ascii=False, indent=2)
-        logger.info("Настройки пользователей сохранены")
-    
-    def add_group(self, chat_id, chat_title):
-        """Добавление или обновление группы"""
-        chat_id_str = str(chat_id)
-        
-        if chat_id_str not in self.groups:
-            self.groups[chat_id_str] = {
+                chat_id = int(key)
+            except ValueError:
+                chat_id = None
+            if chat_id is None or not isinstance(group, dict):
+                logger.error(f"Пропущена некорректная запись группы в {GROUPS_FILE}: {key}")
+                continue
+            
+            self.groups[chat_id] = {
+                "id": chat_id,
+                "title": group.get("title"),
+                "added_at": group.get("added_at"),
+                "last_activity": group.get("last_activity")
+            }
+            self.remember_activity(chat_id, group.get("last_activity"))
+            self._dirty_groups.add(chat_id)
+        
+        for key, settings in self.load_legacy_json(USER_SETTINGS_FILE).items():
+            try:
+                user_id = int(key)
+            except ValueError:
+                user_id = None
+            if (user_id is None or not isinstance(settings, dict)
+                    or not isinstance(settings.get("language"), str)):
+                logger.error(f"Пропущена некорректная запись пользователя в {USER_SETTINGS_FILE}: {key}")
+                continue
+            
+            self.user_settings[user_id] = settings["language"]
+            self._dirty_users.add(user_id)
+        
+        if self._dirty_groups or self._dirty_users:
+            await self.flush()
+            logger.info("Данные перенесены из JSON файлов в базу данных")
+    
+    async def flush(self):
+        """Запись в базу изменённых данных"""
+        if self._dirty_groups:
+            await self.save_groups()
+        if self._dirty_users:
+            await self.save_user_settings()
+    
+    async def _autosave_loop(self):
+        """Периодическое сохранение изменённых данных"""
+        while True:
+            await asyncio.sleep(SAVE_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                # Задача продолжает работу, несохранённые данные остаются помеченными
+                logger.error(f"Ошибка сохранения данных: {e}")
+    
+    def start_autosave(self):
+        """Запуск фонового сохранения"""
+        if self._autosave_task is None:
+            self._autosave_task = asyncio.create_task(self._autosave_loop())
+    
+    async def stop_autosave(self):
+        """Остановка фонового сохранения с записью несохранённых данных"""
+        if self._autosave_task is not None:
+            self._autosave_task.cancel()
+            try:
+                await self._autosave_task
+            except asyncio.CancelledError:
+                pass
+            self._autosave_task = None
+        await self.flush()
+    
+    def now(self):
+        """Текущее время: (секунды, строка ISO), строка кэшируется в пределах секунды"""
+        now_ts = int(time.time())
+        if now_ts != self._now_cached[0]:
+            self._now_cached = (now_ts, datetime.fromtimestamp(now_ts).isoformat())
+        return self._now_cached
+    
+    def remember_activity(self, chat_id, last_activity):
+        """Запоминание времени последней активности группы из строки ISO"""
+        try:
+            self._activity_ts[chat_id] = datetime.fromisoformat(last_activity).timestamp()
+        except (TypeError, ValueError):
+            self._activity_ts[chat_id] = 0
+    
+    def add_group(self, chat_id, chat_title, skip_if_recent=ACTIVITY_UPDATE_INTERVAL):
+        """Добавление или обновление группы
+        
+        Если название не изменилось, а активность обновлялась менее
+        skip_if_recent секунд назад, группа не помечается для сохранения.
+        """
+        now_ts, now_iso = self.now()
+        
+        if chat_id not in self.groups:
+            self.groups[chat_id] = {
                 "id": chat_id,
                 "title": chat_title,
-                "added_at": datetime.now().isoformat(),
-                "last_activity": datetime.now().isoformat()
+                "added_at": now_iso,
+                "last_activity": now_iso
             }
+            self._activity_ts[chat_id] = now_ts
             logger.info(f"Добавлена новая группа: {chat_title} (ID: {chat_id})")
         else:
+            group = self.groups[chat_id]
+            
+            # Не трогаем данные, если название не изменилось,
+            # а активность уже обновлялась недавно
+            if skip_if_recent and group["title"] == chat_title:
+                if now_ts - self._activity_ts.get(chat_id, 0) < skip_if_recent:
+                    return
+            
             # Обновляем название и время последней активности
-            self.groups[chat_id_str]["title"] = chat_title
-            self.groups[chat_id_str]["last_activity"] = datetime.now().isoformat()
+            group["title"] = chat_title
+            group["last_activity"] = now_iso
+            self._activity_ts[chat_id] = now_ts
         
-        self.save_groups()
+        self._dirty_groups.add(chat_id)
     
     def get_user_language(self, user_id):
         """Получение языка пользователя"""
-        user_id_str = str(user_id)
-        return self.user_settings.get(user_id_str, {}).get("language", "RU")
+        return self.user_settings.get(user_id, "RU")
     
     def set_user_language(self, user_id, language):
         """Установка языка пользователя"""
-        user_id_str = str(user_id)
-        
-        if user_id_str not in self.user_settings:
-            self.user_settings[user_id_str] = {}
-        
-        self.user_settings[user_id_str]["language"] = language
-        self.save_user_settings()
+        self.user_settings[user_id] = language
+        self._dirty_users.add(user_id)
         logger.info(f"Язык пользователя {user_id} изменен на {language}")
 
 
 class SupportBot:
     """Основной класс бота техподдержки"""
     
+    # Шаблон тела запроса для Pyrus
+    _PAYLOAD_TEMPLATE = {
+        "form_id": PYRUS_FORM_ID,
+        "text": None,
+        "fields": None
+    }
+    
     def __init__(self):
-        self.user_data = {}
+        # Брошенные на середине заявки удаляются автоматически
+        self.user_data = TTLCache(maxsize=SESSION_MAX_SIZE, ttl=SESSION_TTL)
+        self._cleanup_task = None
         self.localization = LocalizationManager()
         self.data_manager = DataManager()
+        self._http = None
+        
+        # Клавиатуры не зависят от пользователя, поэтому создаются один раз
+        self._lang_select_markup = InlineKeyboardMarkup([[
+            InlineKeyboardButton("🇷🇺 Русский", callback_data='lang_RU'),
+            InlineKeyboardButton("🇺🇿 O'zbekcha", callback_data='lang_UZ')
+        ]])
+        # Клавиатуры с текстами создаются один раз для каждого языка
+        self._markups = {
+            lang: self.build_markups(lang) for lang in self.localization.locales
+        }
+    
+    async def post_init(self, application: Application):
+        """Подключение к базе, создание HTTP-сессии и запуск фоновых задач"""
+        # Одна сессия на всё время работы бота: пул соединений с Pyrus
+        # переиспользуется, TCP/TLS рукопожатие не повторяется на каждую заявку
+        self._http = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=PYRUS_MAX_CONNECTIONS,
+                keepalive_timeout=PYRUS_KEEPALIVE_TIMEOUT
+            ),
+            headers=_PYRUS_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=PYRUS_TIMEOUT)
+        )
+        await self.data_manager.open()
+        self.data_manager.start_autosave()
+        self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+    
+    async def post_shutdown(self, application: Application):
+        """Сохранение данных и закрытие HTTP-сессии при остановке приложения"""
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            try:
+                await self._cleanup_task
+            except asyncio.CancelledError:
+                pass
+            self._cleanup_task = None
+        await self.data_manager.close()
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+    
+    async def _cleanup_loop(self):
+        """Периодическое удаление просроченных заявок"""
+        while True:
+            await asyncio.sleep(SESSION_CLEANUP_INTERVAL)
+            self.user_data.expire()
     
     def get_text(self, user_id, *keys, **kwargs):
         """Получение локализованного текста для пользователя"""
         lang = self.data_manager.get_user_language(user_id)
         return self.localization.get(lang, *keys, **kwargs)
     
+    def get_markup(self, name, lang):
+        """Получение клавиатуры на нужном языке (с откатом на русский язык)"""
+        return self._markups.get(lang, self._markups['RU'])[name]
+    
+    def build_markups(self, lang):
+        """Создание клавиатур на нужном языке"""
+        return {
+            # Кнопка выбора языка
+            'welcome': InlineKeyboardMarkup([
+                [InlineKeyboardButton(
+                    self.localization.get(lang, 'menu.select_language'),
+                    callback_data='select_language'
+                )]
+            ]),
+            # Кнопка "Нет филиала"
+            'no_branch': InlineKeyboardMarkup([[
+                InlineKeyboardButton(
+                    self.localization.get(lang, 'ticket.no_branch'),
+                    callback_data='no_branch'
+                )
+            ]]),
+            # Кнопки подтверждения
+            'confirm': InlineKeyboardMarkup([
+                [InlineKeyboardButton(
+                    self.localization.get(lang, 'ticket.btn_confirm'),
+                    callback_data='confirm_ticket'
+                )],
+                [InlineKeyboardButton(
+                    self.localization.get(lang, 'ticket.btn_cancel'),
+                    callback_data='cancel_ticket'
+                )]
+            ]),
+        }
+    
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Приветственное сообщение при добавлении в группу"""
         chat = update.effective_chat
         user_id = update.effective_user.id
+        lang = self.data_manager.get_user_language(user_id)
+        t = partial(self.localization.get, lang)
         
         if chat.type in ['group', 'supergroup']:
             # Сохраняем информацию о группе
             self.data_manager.add_group(chat.id, chat.title)
             
-            welcome_message = (
-                f"{self.get_text(user_id, 'welcome', 'title')}\n\n"
-                f"{self.get_text(user_id, 'welcome', 'description')}\n\n"
-                f"{self.get_text(user_id, 'welcome', 'features')}\n\n"
-                f"{self.get_text(user_id, 'welcome', 'commands')}\n\n"
-                f"{self.get_text(user_id, 'welcome', 'warning')}"
-            )
-            
-            # Кнопка выбора языка
-            keyboard = [
-                [InlineKeyboardButton(
-                    self.get_text(user_id, 'menu', 'select_language'),
-                    callback_data='select_language'
-                )]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            welcome_message = self.localization.get_composite(lang, 'welcome_group_saved')
+            reply_markup = self.get_markup('welcome', lang)
             
             await update.message.reply_text(welcome_message, reply_markup=reply_markup)
-            await update.message.reply_text(
-                self.get_text(user_id, 'ticket', 'group_saved')
-            )
         else:
             await update.message.reply_text(
-                self.get_text(user_id, 'errors', 'group_only')
+                t('errors.group_only')
             )
     
     async def language_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -210,15 +570,8 @@ class SupportBot:
     
     async def show_language_selection(self, update: Update, user_id: int):
         """Показать меню выбора языка"""
-        keyboard = [
-            [
-                InlineKeyboardButton("🇷🇺 Русский", callback_data='lang_RU'),
-                InlineKeyboardButton("🇺🇿 O'zbekcha", callback_data='lang_UZ')
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        text = self.localization.get('RU', 'language', 'select')
+        reply_markup = self._lang_select_markup
+        text = self.localization.get('RU', 'language.select')
         
         if update.callback_query:
             await update.callback_query.edit_message_text(
@@ -242,18 +595,20 @@ class SupportBot:
             self.data_manager.set_user_language(user_id, language)
             
             await query.edit_message_text(
-                self.get_text(user_id, 'language', 'changed')
+                self.get_text(user_id, 'language.changed')
             )
     
     async def sos_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Начало процесса создания заявки"""
         user_id = update.effective_user.id
         chat = update.effective_chat
+        lang = self.data_manager.get_user_language(user_id)
+        t = partial(self.localization.get, lang)
         
         # Проверяем, что команда вызвана в группе
         if chat.type not in ['group', 'supergroup']:
             await update.message.reply_text(
-                self.get_text(user_id, 'errors', 'group_only')
+                t('errors.group_only')
             )
             return ConversationHandler.END
         
@@ -262,23 +617,16 @@ class SupportBot:
         
         # Сохраняем название группы
         group_name = chat.title
-        self.user_data[user_id] = {
-            'group_name': group_name,
-            'group_id': chat.id,
-            'user_name': update.effective_user.full_name
-        }
+        self.user_data[user_id] = TicketDraft(
+            group_name=group_name,
+            group_id=chat.id,
+            user_name=update.effective_user.full_name
+        )
         
-        # Создаём кнопку "Нет филиала"
-        keyboard = [[
-            InlineKeyboardButton(
-                self.get_text(user_id, 'ticket', 'no_branch'),
-                callback_data='no_branch'
-            )
-        ]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = self.get_markup('no_branch', lang)
         
         await update.message.reply_text(
-            self.get_text(user_id, 'ticket', 'enter_branch_name'),
+            t('ticket.enter_branch_name'),
             reply_markup=reply_markup
         )
         
@@ -288,24 +636,27 @@ class SupportBot:
         """Получение филиала от пользователя"""
         user_id = update.effective_user.id
         branch = update.message.text.strip()
+        lang = self.data_manager.get_user_language(user_id)
+        t = partial(self.localization.get, lang)
         
         if not branch:
             await update.message.reply_text(
-                self.get_text(user_id, 'errors', 'empty_branch')
+                t('errors.empty_branch')
             )
             return BRANCH
         
         # Сохраняем филиал
-        if user_id in self.user_data:
-            self.user_data[user_id]['branch'] = branch
+        data = self.user_data.get(user_id)
+        if data is not None:
+            data.branch = branch
             
             await update.message.reply_text(
-                self.get_text(user_id, 'ticket', 'describe_problem')
+                t('ticket.describe_problem')
             )
             return DESCRIPTION
         else:
             await update.message.reply_text(
-                self.get_text(user_id, 'errors', 'general_error')
+                t('errors.general_error')
             )
             return ConversationHandler.END
     
@@ -315,65 +666,58 @@ class SupportBot:
         await query.answer()
         
         user_id = update.effective_user.id
+        lang = self.data_manager.get_user_language(user_id)
+        t = partial(self.localization.get, lang)
         
-        if user_id in self.user_data:
-            self.user_data[user_id]['branch'] = 'Не указан'
+        data = self.user_data.get(user_id)
+        if data is not None:
+            data.branch = 'Не указан'
             
             await query.edit_message_text(
-                self.get_text(user_id, 'ticket', 'describe_problem')
+                t('ticket.describe_problem')
             )
         else:
             await query.edit_message_text(
-                self.get_text(user_id, 'errors', 'general_error')
+                t('errors.general_error')
             )
     
     async def receive_description(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Получение описания проблемы"""
         user_id = update.effective_user.id
         description = update.message.text.strip()
+        lang = self.data_manager.get_user_language(user_id)
+        t = partial(self.localization.get, lang)
         
         if not description:
             await update.message.reply_text(
-                self.get_text(user_id, 'errors', 'empty_description')
+                t('errors.empty_description')
             )
             return DESCRIPTION
         
-        if user_id not in self.user_data:
+        data = self.user_data.get(user_id)
+        if data is None:
             await update.message.reply_text(
-                self.get_text(user_id, 'errors', 'general_error')
+                t('errors.general_error')
             )
             return ConversationHandler.END
         
         # Сохраняем описание
-        self.user_data[user_id]['description'] = description
+        data.description = description
         
         # Показываем подтверждение
-        data = self.user_data[user_id]
-        summary = self.get_text(
-            user_id,
-            'ticket',
-            'confirm_details',
-            user_name=data['user_name'],
-            group_name=data['group_name'],
-            branch=data['branch'],
-            description=data['description']
+        confirm_message = self.localization.get_composite(
+            lang,
+            'confirm_full',
+            user_name=data.user_name,
+            group_name=data.group_name,
+            branch=data.branch,
+            description=data.description
         )
         
-        # Кнопки подтверждения
-        keyboard = [
-            [InlineKeyboardButton(
-                self.get_text(user_id, 'ticket', 'btn_confirm'),
-                callback_data='confirm_ticket'
-            )],
-            [InlineKeyboardButton(
-                self.get_text(user_id, 'ticket', 'btn_cancel'),
-                callback_data='cancel_ticket'
-            )]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = self.get_markup('confirm', lang)
         
         await update.message.reply_text(
-            f"{self.get_text(user_id, 'ticket', 'confirm_title')}\n\n{summary}",
+            confirm_message,
             reply_markup=reply_markup
         )
         
@@ -385,74 +729,64 @@ class SupportBot:
         await query.answer()
         
         user_id = update.effective_user.id
+        lang = self.data_manager.get_user_language(user_id)
+        t = partial(self.localization.get, lang)
         
         try:
             if query.data == 'confirm_ticket':
-                if user_id in self.user_data:
-                    data = self.user_data[user_id]
-                    
+                data = self.user_data.get(user_id)
+                if data is not None:
                     # Отправляем заявку в Pyrus
                     success = await self.send_to_pyrus(data)
                     
                     if success:
                         await query.edit_message_text(
-                            self.get_text(user_id, 'ticket', 'created')
+                            t('ticket.created')
                         )
                     else:
                         await query.edit_message_text(
-                            self.get_text(user_id, 'errors', 'pyrus_error')
+                            t('errors.pyrus_error')
                         )
                     
                     # Очищаем данные пользователя
-                    del self.user_data[user_id]
+                    self.user_data.pop(user_id, None)
                 else:
                     await query.edit_message_text(
-                        self.get_text(user_id, 'errors', 'general_error')
+                        t('errors.general_error')
                     )
             
             elif query.data == 'cancel_ticket':
-                if user_id in self.user_data:
-                    del self.user_data[user_id]
+                self.user_data.pop(user_id, None)
                 
                 await query.edit_message_text(
-                    self.get_text(user_id, 'ticket', 'cancelled')
+                    t('ticket.cancelled')
                 )
         except Exception as e:
             logger.error(f"Ошибка при обработке callback заявки: {e}")
             await query.edit_message_text(
-                self.get_text(user_id, 'errors', 'general_error')
+                t('errors.general_error')
             )
     
     async def send_to_pyrus(self, data):
         """Отправка заявки в Pyrus"""
         try:
-            url = "https://api.pyrus.com/v4/tasks"
-            
-            headers = {
-                "Authorization": f"Bearer {PYRUS_API_TOKEN}",
-                "Content-Type": "application/json"
-            }
-            
             # Формируем тело запроса для Pyrus
-            payload = {
-                "form_id": PYRUS_FORM_ID,
-                "text": f"Новая заявка от {data['user_name']} из группы {data['group_name']}",
-                "fields": [
-                    {"id": 1, "value": data['group_name']},      # Поле "Группа"
-                    {"id": 2, "value": data['branch']},          # Поле "Филиал"
-                    {"id": 3, "value": data['description']}      # Поле "Описание"
-                ]
-            }
-            
-            # Отправляем запрос
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
+            payload = self._PAYLOAD_TEMPLATE.copy()
+            payload["text"] = f"Новая заявка от {data.user_name} из группы {data.group_name}"
+            payload["fields"] = [
+                {"id": 1, "value": data.group_name},      # Поле "Группа"
+                {"id": 2, "value": data.branch},          # Поле "Филиал"
+                {"id": 3, "value": data.description}      # Поле "Описание"
+            ]
             
-            if response.status_code == 200:
-                logger.info(f"Заявка успешно отправлена в Pyrus: {data}")
-                return True
-            else:
-                logger.error(f"Ошибка Pyrus API: {response.status_code} - {response.text}")
-                return False
+            # Отправляем запрос, не блокируя цикл событий
+            async with self._http.post(PYRUS_API_URL, data=orjson.dumps(payload)) as response:
+                if response.status == 200:
+                    logger.info(f"Заявка успешно отправлена в Pyrus: {data}")
+                    return True
+                else:
+                    logger.error(f"Ошибка Pyrus API: {response.status} - {await response.text()}")
+                    return False
                 
         except Exception as e:
             logger.error(f"Ошибка при отправке в Pyrus: {e}")
@@ -462,11 +796,10 @@ class SupportBot:
         """Отмена создания заявки"""
         user_id = update.effective_user.id
         
-        if user_id in self.user_data:
-            del self.user_data[user_id]
+        self.user_data.pop(user_id, None)
         
         await update.message.reply_text(
-            self.get_text(user_id, 'ticket', 'cancelled')
+            self.get_text(user_id, 'ticket.cancelled')
         )
         return ConversationHandler.END
     
@@ -474,7 +807,7 @@ class SupportBot:
         """Команда помощи"""
         user_id = update.effective_user.id
         await update.message.reply_text(
-            self.get_text(user_id, 'help', 'text')
+            self.get_text(user_id, 'help.text')
         )
 
 
@@ -495,7 +828,13 @@ def main():
     bot = SupportBot()
     
     # Создаём приложение
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .post_init(bot.post_init)
+        .post_shutdown(bot.post_shutdown)
+        .build()
+    )
     
     # Обработчик диалога для создания заявки
     conv_handler = ConversationHandler(
@@ -503,7 +842,7 @@ def main():
         states={
             BRANCH: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, bot.receive_branch),
-                CallbackQueryHandler(bot.no_branch_callback, pattern='^no_branch$')
+                CallbackDataHandler(bot.no_branch_callback, exact=('no_branch',))
             ],
             DESCRIPTION: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, bot.receive_description)
@@ -518,13 +857,14 @@ def main():
     application.add_handler(CommandHandler('help', bot.help_command))
     
     # Обработчик callback кнопок перед ConversationHandler
-    application.add_handler(CallbackQueryHandler(
+    application.add_handler(CallbackDataHandler(
         bot.language_callback,
-        pattern='^(select_language|lang_)'
+        exact=('select_language',),
+        prefixes=('lang_',)
     ))
-    application.add_handler(CallbackQueryHandler(
+    application.add_handler(CallbackDataHandler(
         bot.confirm_ticket_callback,
-        pattern='^(confirm_ticket|cancel_ticket)$'
+        exact=('confirm_ticket', 'cancel_ticket')
     ))
     
     # Обработчик диалога добавляем последним
@@ -533,7 +873,17 @@ def main():
     # Запускаем бота
     logger.info("✅ Бот запущен!")
     try:
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        if WEBHOOK_HOST == "ВАШ_ДОМЕН":
+            logger.info("WEBHOOK_HOST не заполнен, обновления получаются через polling")
+            application.run_polling(allowed_updates=Update.ALL_TYPES)
+        else:
+            application.run_webhook(
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                url_path=TELEGRAM_TOKEN,
+                webhook_url=f"https://{WEBHOOK_HOST}/{TELEGRAM_TOKEN}",
+                allowed_updates=Update.ALL_TYPES
+            )
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем")
     except Exception as e: